@@ -12,7 +12,6 @@ import argparse
 from iou_tracker import track_iou
 from util import load_mot, save_to_csv
 from viou_tracker import track_viou
-from IPython import embed
 import numpy as np
 from Set_ROI import Set_ROI
 import gc, os
@@ -42,7 +41,8 @@ def main(args, ROI):
 
     if args.visual:
         tracks = track_viou(args.frames_path, detections, args.sigma_l, args.sigma_h, args.sigma_iou, args.t_min,
-                            args.ttl, args.visual, args.keep_upper_height_ratio, ROI, args.track_cls)
+                            args.ttl, args.visual, args.keep_upper_height_ratio, ROI, args.track_cls,
+                            frame_scale=args.frame_scale)
     else:
         if with_classes:
             # track_viou can also be used without visual tracking, but note that the speed will be much slower compared
@@ -81,6 +81,8 @@ if __name__ == '__main__':
                         help="minimum track length")
     parser.add_argument('-ttl', '--ttl', type=int, default=10,
                         help="time to live parameter for v-iou")
+    parser.add_argument('-fs', '--frame_scale', type=int, default=1,
+                        help="decode frames at 1/frame_scale resolution for visual tracking (1, 2 or 4)")
     parser.add_argument('-nms', '--nms', type=float, default=0.2,
                         help="nms for loading multi-class detections")
     parser.add_argument('-fmt', '--format', type=str, default='fish',
@@ -5,6 +5,7 @@
 # Written by Erik Bochinski
 # ---------------------------------------------------------
 
+from collections import Counter
 from time import time
 
 from util import load_mot, iou
@@ -87,7 +88,7 @@ def track_iou(detections, sigma_l, sigma_h, sigma_iou, t_min, ROI, track_cls):
 
     # remove last visually tracked frames and compute the track classes
     for track in tracks_finished:
-        track['class'] = max(set(track['classes']), key=track['classes'].count)  # majority vote track class
+        track['class'] = Counter(track['classes']).most_common(1)[0][0]  # majority vote track class
 
     print('Tracking...Done!')
 
@@ -10,7 +10,13 @@ import os
 
 import numpy as np
 from tqdm import tqdm
-from IPython import embed
+
+numba_available = True
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+    numba_available = False
 
 visdrone_classes = {'car': 4, 'bus': 9, 'truck': 6, 'pedestrian': 1, 'van': 5}
 
@@ -48,8 +54,6 @@ def load_mot(detections, nms_overlap_thresh=None, with_classes=True, nms_per_cla
 
 
     #Jie Mei code to get raw and data
-    from IPython import embed
-
     file = csv.reader(open(detections,'r'))
     raw0 = []
     for i, line in enumerate(file):
@@ -285,23 +289,11 @@ def save_to_csv(out_path, tracks, all_frame_name, fmt='motchallenge'):
             id_ += 1
 
 
-def iou(bbox1, bbox2):
-    """
-    Calculates the intersection-over-union of two bounding boxes.
-
-    Args:
-        bbox1 (numpy.array, list of floats): bounding box in format x1,y1,x2,y2.
-        bbox2 (numpy.array, list of floats): bounding box in format x1,y1,x2,y2.
-
-    Returns:
-        int: intersection-over-onion of bbox1, bbox2
-    """
-
-    bbox1 = [float(x) for x in bbox1]
-    bbox2 = [float(x) for x in bbox2]
-
-    (x0_1, y0_1, x1_1, y1_1) = bbox1
-    (x0_2, y0_2, x1_2, y1_2) = bbox2
+def _iou_scalar(x0_1, y0_1, x1_1, y1_1, x0_2, y0_2, x1_2, y1_2):
+    """scalar IOU kernel on unpacked coordinates, jit-compiled by numba when available."""
+    # cheap short-circuit: no overlap on either axis is the common case
+    if x1_1 <= x0_2 or x1_2 <= x0_1 or y1_1 <= y0_2 or y1_2 <= y0_1:
+        return 0.
 
     # get the overlap rectangle
     overlap_x0 = max(x0_1, x0_2)
@@ -311,7 +303,7 @@ def iou(bbox1, bbox2):
 
     # check if there is an overlap
     if overlap_x1 - overlap_x0 <= 0 or overlap_y1 - overlap_y0 <= 0:
-        return 0
+        return 0.
 
     # if yes, calculate the ratio of the overlap to each ROI size and the unified size
     size_1 = (x1_1 - x0_1) * (y1_1 - y0_1)
@@ -321,6 +313,68 @@ def iou(bbox1, bbox2):
 
     return size_intersection / size_union
 
+
+if numba_available:
+    _iou_scalar = njit(cache=True, fastmath=True)(_iou_scalar)
+    _iou_scalar(0., 0., 1., 1., 0., 0., 1., 1.)  # warm up the jit once at import
+
+
+def _prefilter_kernel(bboxes, scores, cls_ok, sigma_l, roi):
+    """fused score / ROI-center test over one frame's detections, jit-compiled by numba
+    when available. cls_ok carries the class membership, which is decided by the caller
+    since the class labels are strings."""
+    n = bboxes.shape[0]
+    mask = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        if scores[i] < sigma_l or not cls_ok[i]:
+            continue
+        x_c = (bboxes[i, 0] + bboxes[i, 2]) * 0.5
+        y_c = (bboxes[i, 1] + bboxes[i, 3]) * 0.5
+        if roi[0] < x_c < roi[0] + roi[2] and roi[1] < y_c < roi[1] + roi[3]:
+            mask[i] = True
+    return mask
+
+
+if numba_available:
+    _prefilter_kernel = njit(cache=True)(_prefilter_kernel)
+    _prefilter_kernel(np.zeros((1, 4), dtype=np.float32), np.zeros(1, dtype=np.float32),
+                      np.zeros(1, dtype=np.bool_), 0., np.zeros(4, dtype=np.float32))  # warm up the jit
+
+
+def prefilter(bboxes, scores, cls_ok, sigma_l, roi):
+    """
+    Computes the keep mask for one frame of detections in a single fused pass.
+
+    Args:
+        bboxes (numpy.ndarray): (N,4) float32 boxes in format x1,y1,x2,y2.
+        scores (numpy.ndarray): (N,) float32 detection scores.
+        cls_ok (numpy.ndarray): (N,) bool mask of detections with a tracked class.
+        sigma_l (float): low detection threshold.
+        roi (numpy.ndarray): (4,) float32 region of interest as x,y,w,h.
+
+    Returns:
+        numpy.ndarray: (N,) bool mask of the detections passing all filters.
+    """
+    return _prefilter_kernel(bboxes, scores, cls_ok, sigma_l, roi)
+
+
+def iou(bbox1, bbox2):
+    """
+    Calculates the intersection-over-union of two bounding boxes.
+
+    Args:
+        bbox1 (numpy.array, list of floats): bounding box in format x1,y1,x2,y2.
+        bbox2 (numpy.array, list of floats): bounding box in format x1,y1,x2,y2.
+
+    Returns:
+        int: intersection-over-onion of bbox1, bbox2
+    """
+
+    (x0_1, y0_1, x1_1, y1_1) = [float(x) for x in bbox1]
+    (x0_2, y0_2, x1_2, y1_2) = [float(x) for x in bbox2]
+
+    return _iou_scalar(x0_1, y0_1, x1_1, y1_1, x0_2, y0_2, x1_2, y1_2)
+
 # def num_to_name(idx):
 #     frame_name = all_frame_name[idx]
 #
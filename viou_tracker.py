@@ -5,19 +5,43 @@
 # Written by Erik Bochinski
 # ---------------------------------------------------------
 
+import threading
+from collections import Counter, deque
+from itertools import chain, islice
+from queue import Queue
 from time import time
 
 import cv2, sys
 import numpy as np
-from lapsolver import solve_dense
+from scipy.optimize import linear_sum_assignment
 from tqdm import tqdm
 
-from util import iou, load_mot
+from util import iou, load_mot, prefilter
 from vis_tracker import VisTracker
-from IPython import embed
-from pympler import tracker,summary,muppy
 
-def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl, tracker_type, keep_upper_height_ratio, ROI, track_cls):
+# sentinel cost for (track, detection) pairs below the IOU threshold
+INVALID_COST = 1e6
+
+
+# imread flags per supported frame downscale factor
+IMREAD_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}
+
+
+def _read_frames(frames_path, detections, frame_queue, imread_flags=cv2.IMREAD_COLOR):
+    """ producer thread: reads and decodes frames ahead of the tracking loop so
+    disk I/O and JPEG decoding overlap with the tracking work on the previous frame. """
+    for detections_frame in detections:
+        frame_path = frames_path+'/'+detections_frame[0]['frame_name']  # only read frames with detections
+        # frame_path = frames_path.format(frame_num)  # MOT all frames will be read
+        frame_queue.put((frame_path, cv2.imread(frame_path, imread_flags)))
+
+
+def _scale_bbox(bbox, factor):
+    """ scale all four bbox coordinates, used to map between detection and frame resolution. """
+    return tuple(x * factor for x in bbox)
+
+
+def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl, tracker_type, keep_upper_height_ratio, ROI, track_cls, window_size=None, n_jobs=4, frame_scale=1):
     """ V-IOU Tracker.
     See "Extending IOU Based Multi-Object Tracking by Visual Information by E. Bochinski, T. Senst, T. Sikora" for
     more information.
@@ -35,35 +59,163 @@ def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
          tracker_type (str): name of the visual tracker to use. see VisTracker for more details.
          keep_upper_height_ratio (float): float between 0.0 and 1.0 that determines the ratio of height of the object
                                           to track to the total height of the object used for visual tracking.
+         window_size (int, optional): number of frames per temporal window. if given and the video is longer than
+                                      one window, the windows are tracked in parallel and the resulting tracks are
+                                      stitched at the window boundaries. None (default) tracks sequentially as before.
+         n_jobs (int, optional): number of parallel workers for windowed tracking.
+         frame_scale (int, optional): decode frames at 1/frame_scale resolution (1, 2 or 4) for visual
+                                      tracking. bboxes stay in detection resolution. 1 (default) decodes
+                                      at full resolution.
 
     Returns:
         list: list of tracks.
     """
+    if window_size is None or len(detections) <= window_size:
+        return _track_window(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
+                             tracker_type, keep_upper_height_ratio, ROI, track_cls,
+                             frame_scale=frame_scale)
+
+    from joblib import Parallel, delayed  # only needed for windowed tracking
+
+    # windows overlap by 2*ttl+1 frames so tracks crossing a boundary are seen by both sides
+    overlap = 2 * ttl + 1
+    starts = list(range(0, len(detections), window_size))
+    results = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_track_window)(frames_path, detections[start:start + window_size + overlap],
+                               sigma_l, sigma_h, sigma_iou, t_min, ttl, tracker_type,
+                               keep_upper_height_ratio, ROI, track_cls, frame_offset=start,
+                               frame_scale=frame_scale)
+        for start in starts)
+
+    # stitch window results pairwise along the boundaries
+    tracks_finished = results[0]
+    for start, window_tracks in zip(starts[1:], results[1:]):
+        tracks_finished = _stitch_tracks(tracks_finished, window_tracks, start + 1, overlap, sigma_iou)
+
+    return tracks_finished
+
+
+def _stitch_tracks(tracks_a, tracks_b, boundary_frame, overlap, sigma_iou):
+    """ merge the tracks of two adjacent temporal windows.
+
+    tracks_a are tracks finished up to and including the overlap region, tracks_b come from the
+    window starting at boundary_frame. pairs are matched by mean IOU over their shared frames in
+    the overlap region via linear assignment, matched pairs are merged into the tracks_a entry.
+    unmatched tracks_b entries lying entirely inside the overlap region are dropped as they were
+    already seen (or rejected) by the previous window.
+
+    Args:
+        tracks_a (list): stitched tracks of all previous windows.
+        tracks_b (list): tracks of the next window.
+        boundary_frame (int): first frame number of the next window (1-based, global).
+        overlap (int): number of frames shared by both windows.
+        sigma_iou (float): minimum mean IOU of a valid boundary match.
+
+    Returns:
+        list: merged list of tracks.
+    """
+    overlap_end = boundary_frame + overlap - 1
+    cand_a = [t for t in tracks_a if t['start_frame'] + len(t['bboxes']) - 1 >= boundary_frame]
+    cand_b = [t for t in tracks_b if t['start_frame'] <= overlap_end]
+
+    matched_b = set()
+    if cand_a and cand_b:
+        costs = np.full((len(cand_a), len(cand_b)), INVALID_COST, dtype=np.float32)
+        for row, ta in enumerate(cand_a):
+            end_a = ta['start_frame'] + len(ta['bboxes']) - 1
+            for col, tb in enumerate(cand_b):
+                end_b = tb['start_frame'] + len(tb['bboxes']) - 1
+                lo = max(ta['start_frame'], tb['start_frame'], boundary_frame)
+                hi = min(end_a, end_b, overlap_end)
+                if hi < lo:
+                    continue
+                ious = [iou(ta['bboxes'][f - ta['start_frame']], tb['bboxes'][f - tb['start_frame']])
+                        for f in range(lo, hi + 1)]
+                mean_iou = sum(ious) / len(ious)
+                if mean_iou >= sigma_iou:
+                    costs[row, col] = 1 - mean_iou
+
+        rows, cols = linear_sum_assignment(costs)
+        for row, col in zip(rows, cols):
+            if costs[row, col] >= INVALID_COST:
+                continue
+            ta, tb = cand_a[row], cand_b[col]
+            end_a = ta['start_frame'] + len(ta['bboxes']) - 1
+            cont = end_a + 1 - tb['start_frame']  # first tb index not covered by ta
+            if cont < len(tb['bboxes']):
+                ta['bboxes'] += tb['bboxes'][cont:]
+                ta['frame_score'] += tb['frame_score'][cont:]
+            ta['max_score'] = max(ta['max_score'], tb['max_score'])
+            # det_counter of the overlap frames would be counted twice, keep the larger side
+            ta['det_counter'] = max(ta['det_counter'], tb['det_counter'])
+            ta['classes'] += tb['classes']
+            ta['class'] = Counter(ta['classes']).most_common(1)[0][0]  # majority vote track class
+            matched_b.add(id(tb))
+
+    # keep tracks_b entries that are unmatched and not fully contained in the overlap region
+    kept_b = [t for t in tracks_b
+              if id(t) not in matched_b and t['start_frame'] + len(t['bboxes']) - 1 > overlap_end]
+    return tracks_a + kept_b
+
+
+def _track_window(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl, tracker_type,
+                  keep_upper_height_ratio, ROI, track_cls, frame_offset=0, frame_scale=1):
+    """ core V-IOU tracking loop over one (window of) detection frames.
+
+    same arguments as track_viou. frame_offset shifts the frame numbering so that
+    'start_frame' of the returned tracks stays global when tracking a window that
+    does not begin at the first frame of the video.
+    """
     if tracker_type == 'NONE':
         assert ttl == 1, "ttl should not be larger than 1 if no visual tracker is selected"
+    assert frame_scale in IMREAD_FLAGS, "frame_scale must be one of {}".format(sorted(IMREAD_FLAGS))
 
     tracks_active = []
     tracks_extendable = []
     tracks_finished = []
-    frame_buffer = []
+    finished_ids = set()  # id()s of the tracks_finished entries for O(1) membership tests
+    frame_buffer = deque(maxlen=ttl + 1)  # old frames are dropped automatically
+
+    # structure-of-arrays companion of tracks_active: the last bbox of every active track,
+    # rebuilt when tracks_active is reassembled and consumed by associate()
+    active_last_bboxes = np.empty((0, 4), dtype=np.float32)
+
+    # hoisted constants for the per-frame detection prefilter
+    roi_arr = np.asarray(ROI, dtype=np.float32)
+    track_cls_list = list(track_cls)
+
+    # bounded queue keeps at most a few decoded frames in flight
+    frame_queue = Queue(maxsize=4)
+    frame_reader = threading.Thread(target=_read_frames,
+                                    args=(frames_path, detections, frame_queue, IMREAD_FLAGS[frame_scale]),
+                                    daemon=True)
+    frame_reader.start()
 
     print('Tracking...')
-    for frame_num, detections_frame in enumerate(tqdm(detections), start=1):
+    for frame_num, detections_frame in enumerate(tqdm(detections), start=frame_offset + 1):
         # print(sys.getsizeof(tracks_finished))
 
-        # load frame and put into buffer
-        frame_path = frames_path+'/'+detections_frame[0]['frame_name']  # only read frames with detections
-        # frame_path = frames_path.format(frame_num)  # MOT all frames will be read
-        frame = cv2.imread(frame_path)
-        # assert frame is not None, "could not read '{}'".format(frame_path)
-        assert frame is not None, embed()
+        # take the prefetched frame and put into buffer
+        frame_path, frame = frame_queue.get()
+        assert frame is not None, "could not read '{}'".format(frame_path)
         frame_buffer.append(frame)
-        if len(frame_buffer) > ttl + 1:
-            frame_buffer.pop(0)
-
-        # apply low threshold to detections
 
-        dets = [det for det in detections_frame if det['score'] >= sigma_l and in_ROI(det['bbox'], ROI) and det['class'] in track_cls]
+        # apply low threshold to detections.
+        # the score mask comes first so blank-frame placeholders (empty bboxes) never
+        # reach the float conversion, then the remaining filters run in one fused
+        # prefilter pass. the class membership stays outside the kernel as the class
+        # labels are strings
+        scores = np.fromiter((det['score'] for det in detections_frame), dtype=np.float32,
+                             count=len(detections_frame))
+        keep = np.nonzero(scores >= sigma_l)[0]
+        if len(keep) > 0:
+            bboxes = np.array([detections_frame[i]['bbox'] for i in keep], dtype=np.float32)
+            classes = np.array([detections_frame[i]['class'] for i in keep])
+            cls_ok = np.isin(classes, track_cls_list)
+            mask = prefilter(bboxes, scores[keep], cls_ok, sigma_l, roi_arr)
+            dets = [detections_frame[i] for i in keep[mask]]
+        else:
+            dets = []
 
 
 
@@ -71,10 +223,11 @@ def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
         #     embed()
 
         # associate all detections to existing tracks, save updated tracks into updated_tracks
-        track_ids, det_ids = associate(tracks_active, dets, sigma_iou)
+        track_ids, det_ids = associate(tracks_active, dets, sigma_iou, active_last_bboxes)
         updated_tracks = []
         for track_id, det_id in zip(track_ids, det_ids):
             tracks_active[track_id]['bboxes'].append(dets[det_id]['bbox'])
+            tracks_active[track_id]['last_bbox_arr'] = np.asarray(dets[det_id]['bbox'], dtype=np.float32)
             tracks_active[track_id]['max_score'] = max(tracks_active[track_id]['max_score'], dets[det_id]['score'])
             tracks_active[track_id]['frame_score'].append(dets[det_id]['score'])
             tracks_active[track_id]['classes'].append(dets[det_id]['class'])
@@ -88,17 +241,24 @@ def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
             updated_tracks.append(tracks_active[track_id])
 
         # for tracks that no new detections assigned
-        tracks_not_updated = [tracks_active[idx] for idx in set(range(len(tracks_active))).difference(set(track_ids))]
+        not_updated_mask = np.ones(len(tracks_active), dtype=bool)
+        not_updated_mask[track_ids] = False
+        tracks_not_updated = [tracks_active[idx] for idx in np.nonzero(not_updated_mask)[0]]
 
         # for tracks no updated (no new detections)
         for track in tracks_not_updated:
             if track['ttl'] > 0:
                 if track['ttl'] == ttl: # means no v tracker yet
                     # init visual tracker, using last frame's bbox, and last frame
-                    track['visual_tracker'] = VisTracker(tracker_type, track['bboxes'][-1], frame_buffer[-2],
+                    init_bbox = track['bboxes'][-1] if frame_scale == 1 \
+                        else _scale_bbox(track['bboxes'][-1], 1. / frame_scale)
+                    track['visual_tracker'] = VisTracker(tracker_type, init_bbox, frame_buffer[-2],
                                                          keep_upper_height_ratio)
                 # viou forward update, find similar object in this frame
                 ok, bbox = track['visual_tracker'].update(frame)
+                if frame_scale != 1:
+                    # map the visually tracked box back to detection resolution
+                    bbox = _scale_bbox(bbox, frame_scale)
 
                 # print(str(track['start_frame'])+': '+ frame_path.split('/')[-1] + ': '+str(ok) + str(bbox))
 
@@ -109,6 +269,7 @@ def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
                 # found similar object, ttl-1, add bbox to this track, put it into updated_tracks
                 track['ttl'] -= 1
                 track['bboxes'].append(bbox)
+                track['last_bbox_arr'] = np.asarray(bbox, dtype=np.float32)
                 track['frame_score'].append('-1') #represent predicted from viou
                 updated_tracks.append(track)
                 # print(track['bboxes'][-1])
@@ -117,37 +278,61 @@ def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
                 tracks_extendable.append(track)
 
         # update the list of extendable tracks. tracks that are too old are moved to the finished_tracks. this should
-        # not be necessary but may improve the performance for large numbers of tracks (eg. for mot19)
-        tracks_extendable_updated = []
-        for track in tracks_extendable:
-            if track['start_frame'] + len(track['bboxes']) + ttl - track['ttl'] >= frame_num:  ### there is room for viou to try some times
-                tracks_extendable_updated.append(track)
-            elif track['max_score'] >= sigma_h and track['det_counter'] >= t_min:
-                tracks_finished.append(track)
-        tracks_extendable = tracks_extendable_updated  # tracks that have no assigned bbox from dets or visual tracker
+        # not be necessary but may improve the performance for large numbers of tracks (eg. for mot19).
+        # the cutoff is evaluated as vector ops over the hot per-track fields
+        if tracks_extendable:
+            n_ext = len(tracks_extendable)
+            ext_start = np.fromiter((tr['start_frame'] for tr in tracks_extendable), dtype=np.int64, count=n_ext)
+            ext_len = np.fromiter((len(tr['bboxes']) for tr in tracks_extendable), dtype=np.int64, count=n_ext)
+            ext_ttl = np.fromiter((tr['ttl'] for tr in tracks_extendable), dtype=np.int64, count=n_ext)
+            ext_max_score = np.fromiter((tr['max_score'] for tr in tracks_extendable), dtype=np.float32, count=n_ext)
+            ext_det_counter = np.fromiter((tr['det_counter'] for tr in tracks_extendable), dtype=np.int64, count=n_ext)
+
+            has_room = ext_start + ext_len + ttl - ext_ttl >= frame_num  ### there is room for viou to try some times
+            finish = ~has_room & (ext_max_score >= sigma_h) & (ext_det_counter >= t_min)
+            for i in np.nonzero(finish)[0]:
+                tracks_finished.append(tracks_extendable[i])
+                finished_ids.add(id(tracks_extendable[i]))
+            tracks_extendable = [tracks_extendable[i] for i in np.nonzero(has_room)[0]]
+        # tracks_extendable: tracks that have no assigned bbox from dets or visual tracker
 
         # some detections are not assigned to any tracks
-        new_dets = [dets[idx] for idx in set(range(len(dets))).difference(set(det_ids))]
+        new_det_mask = np.ones(len(dets), dtype=bool)
+        new_det_mask[det_ids] = False
+        new_dets = [dets[idx] for idx in np.nonzero(new_det_mask)[0]]
         dets_for_new = []
 
+        # sorting is not really necessary but helps to avoid different behaviour for different orderings
+        # preferring longer tracks for extension seems intuitive, LAP solving might be better.
+        # tracks_extendable only shrinks (via remove) inside this block, so sort once here
+        # instead of re-sorting for every frame of every new detection
+        ext_sorted = sorted(tracks_extendable, key=lambda x: len(x['bboxes']), reverse=True)
+
+        # deques do not support slicing, materialize the previous frames once
+        prev_frames = list(frame_buffer)[:-1]
+
         for det in new_dets:
             finished = False
             # go backwards and track visually, assign new dets to tracks_extendable
             boxes = []
-            vis_tracker = VisTracker(tracker_type, det['bbox'], frame, keep_upper_height_ratio)
+            init_bbox = det['bbox'] if frame_scale == 1 else _scale_bbox(det['bbox'], 1. / frame_scale)
+            vis_tracker = VisTracker(tracker_type, init_bbox, frame, keep_upper_height_ratio)
 
-            for f in reversed(frame_buffer[:-1]):
+            for f in reversed(prev_frames):
                 ok, bbox = vis_tracker.update(f)
+                if frame_scale != 1:
+                    bbox = _scale_bbox(bbox, frame_scale)
                 if not ok:
                     # can not go further back as the visual tracker failed
                     break
                 boxes.append(bbox)
+                n_boxes = len(boxes)
+                rev_boxes = boxes[::-1]  # reversed copy shared by all candidate tracks
 
-                # sorting is not really necessary but helps to avoid different behaviour for different orderings
-                # preferring longer tracks for extension seems intuitive, LAP solving might be better
-                for track in sorted(tracks_extendable, key=lambda x: len(x['bboxes']), reverse=True):
+                for track in ext_sorted:
 
-                    offset = track['start_frame'] + len(track['bboxes']) + len(boxes) - frame_num
+                    lb = len(track['bboxes'])
+                    offset = track['start_frame'] + lb + n_boxes - frame_num
                     # association not optimal (LAP solving might be better)
                     # association is performed at the same frame, not adjacent ones
                     if 1 <= offset <= ttl - track['ttl'] and iou(track['bboxes'][-offset], bbox) >= sigma_iou:
@@ -156,20 +341,25 @@ def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
                             track['bboxes'] = track['bboxes'][:-offset+1]
                             track['frame_score'] = track['frame_score'][:-offset+1]
                             
-                        track['bboxes'] += list(reversed(boxes))[1:]
-                        track['frame_score'] += len(list(reversed(boxes))[1:]) *['-1']
+                        track['bboxes'].extend(islice(rev_boxes, 1, None))
+                        track['frame_score'].extend(['-1'] * (n_boxes - 1))
                         track['bboxes'].append(det['bbox'])
+                        track['last_bbox_arr'] = np.asarray(det['bbox'], dtype=np.float32)
                         track['frame_score'].append('-1')
                         track['max_score'] = max(track['max_score'], det['score'])
                         track['classes'].append(det['class'])
                         track['ttl'] = ttl
                         track['visual_tracker'] = None
                         
-                        assert len(track['frame_score']) == len(track['bboxes']), embed()
+                        assert len(track['frame_score']) == len(track['bboxes']), \
+                            "frame_score and bboxes of track started at frame {} diverged".format(track['start_frame'])
 
                         tracks_extendable.remove(track)
-                        if track in tracks_finished:
-                            del tracks_finished[tracks_finished.index(track)]
+                        ext_sorted.remove(track)
+                        if id(track) in finished_ids:
+                            # rare case: the track was already finished, pull it back in
+                            tracks_finished = [tr for tr in tracks_finished if tr is not track]
+                            finished_ids.discard(id(track))
                         updated_tracks.append(track)
 
                         finished = True
@@ -181,30 +371,39 @@ def track_viou(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl,
                 dets_for_new.append(det)
 
         # create new tracks
-        new_tracks = [{'bboxes': [det['bbox']], 'max_score': det['score'], 'frame_score':[det['score']],
+        new_tracks = [{'bboxes': [det['bbox']], 'last_bbox_arr': np.asarray(det['bbox'], dtype=np.float32),
+                       'max_score': det['score'], 'frame_score':[det['score']],
                        'start_frame': frame_num, 'ttl': ttl,
                        'classes': [det['class']], 'det_counter': 1, 'visual_tracker': None} for det in dets_for_new]
         tracks_active = []
-        for track in updated_tracks + new_tracks:
+        for track in chain(updated_tracks, new_tracks):
             if track['ttl'] == 0:
                 tracks_extendable.append(track)
             else:
                 tracks_active.append(track)
 
+        # rebuild the last-bbox array alongside the reassembled tracks_active
+        if tracks_active:
+            active_last_bboxes = np.stack([track['last_bbox_arr'] for track in tracks_active])
+        else:
+            active_last_bboxes = np.empty((0, 4), dtype=np.float32)
+
+
+    frame_reader.join()  # the reader has produced exactly one frame per consumed detection frame
 
     # finish all remaining active and extendable tracks
-    tracks_finished = tracks_finished + \
-                      [track for track in tracks_active + tracks_extendable
-                       if track['max_score'] >= sigma_h and track['det_counter'] >= t_min]
+    tracks_finished.extend(track for track in chain(tracks_active, tracks_extendable)
+                           if track['max_score'] >= sigma_h and track['det_counter'] >= t_min)
 
     # remove last visually tracked frames and compute the track classes
     for track in tracks_finished:
         if ttl != track['ttl']:
             track['bboxes'] = track['bboxes'][:-(ttl - track['ttl'])]
             track['frame_score'] = track['frame_score'][:-(ttl - track['ttl'])]
-        track['class'] = max(set(track['classes']), key=track['classes'].count)  # majority vote track class
+        track['class'] = Counter(track['classes']).most_common(1)[0][0]  # majority vote track class
 
         del track['visual_tracker']
+        del track['last_bbox_arr']
     print('Tracking...Done!')
 
     return tracks_finished
@@ -228,12 +427,14 @@ def in_ROI(bbox, ROI):
         return False
 
 
-def associate(tracks, detections, sigma_iou):
+def associate(tracks, detections, sigma_iou, track_bboxes=None):
     """ perform association between tracks and detections in a frame.
     Args:
         tracks (list): input tracks
         detections (list): input detections
         sigma_iou (float): minimum intersection-over-union of a valid association
+        track_bboxes (numpy.ndarray, optional): (N,4) array with the last bbox of every track,
+                                                stacked from the tracks if not supplied
 
     Returns:
         (tuple): tuple containing:
@@ -241,15 +442,49 @@ def associate(tracks, detections, sigma_iou):
         track_ids (numpy.array): 1D array with indexes of the tracks
         det_ids (numpy.array): 1D array of the associated indexes of the detections
     """
-    costs = np.empty(shape=(len(tracks), len(detections)), dtype=np.float32)
-    for row, track in enumerate(tracks):
-        for col, detection in enumerate(detections):
-            costs[row, col] = 1 - iou(track['bboxes'][-1], detection['bbox'])
-
-    np.nan_to_num(costs)
-    costs[costs > 1 - sigma_iou] = np.nan
-    track_ids, det_ids = solve_dense(costs)
-    return track_ids, det_ids
+    if len(tracks) == 0 or len(detections) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    # compute all pairwise IOUs in one broadcasted pass instead of looping over
+    # every (track, detection) pair in python. the tracks carry their last bbox as a
+    # float array already, so stacking avoids re-parsing the bbox tuples
+    if track_bboxes is None:
+        track_bboxes = np.stack([track['last_bbox_arr'] for track in tracks])
+    t = track_bboxes.reshape(-1, 1, 4)
+    d = np.asarray([det['bbox'] for det in detections], dtype=np.float32).reshape(1, -1, 4)
+
+    tl = np.maximum(t[..., :2], d[..., :2])
+    br = np.minimum(t[..., 2:], d[..., 2:])
+    wh = np.clip(br - tl, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    area_t = (t[..., 2] - t[..., 0]) * (t[..., 3] - t[..., 1])
+    area_d = (d[..., 2] - d[..., 0]) * (d[..., 3] - d[..., 1])
+    union = area_t + area_d - inter
+
+    # write the costs into a scratch buffer reused across frames instead of allocating a
+    # fresh matrix per call. grown to the next power of two when too small. this is only
+    # safe single-threaded, which holds here: each window calls associate sequentially and
+    # parallel windows live in separate worker processes.
+    n, m = len(tracks), len(detections)
+    if associate._buf.shape[0] < n or associate._buf.shape[1] < m:
+        # only ever grow, so alternating track/detection counts cannot force a
+        # reallocation on every call
+        associate._buf = np.empty((max(associate._buf.shape[0], 1 << (n - 1).bit_length()),
+                                   max(associate._buf.shape[1], 1 << (m - 1).bit_length())),
+                                  dtype=np.float32)
+    costs = associate._buf[:n, :m]
+    np.divide(inter, np.maximum(union, 1e-9), out=costs)
+    np.subtract(1, costs, out=costs)
+
+    # mark pairs below the IOU threshold with a large sentinel instead of nan,
+    # solve the assignment and drop the invalid pairs afterwards
+    costs[costs > 1 - sigma_iou] = INVALID_COST
+    track_ids, det_ids = linear_sum_assignment(costs)
+    valid = costs[track_ids, det_ids] < INVALID_COST
+    return track_ids[valid], det_ids[valid]
+
+
+associate._buf = np.empty((0, 0), dtype=np.float32)  # scratch cost buffer, see associate()
 
 
 def track_viou_matlab_wrapper(frames_path, detections, sigma_l, sigma_h, sigma_iou, t_min, ttl, tracker_type,